@@ -9,14 +9,20 @@ import argparse
 import threading
 import time
 import webbrowser
+from typing import TYPE_CHECKING
 
-import uvicorn
+if TYPE_CHECKING:
+    import uvicorn
 
 
-def _launch_browser(url: str, delay: float) -> None:
-    """稍后打开浏览器，避免服务器尚未完成启动。"""
-    time.sleep(max(delay, 0.0))
-    webbrowser.open(url)
+def _open_browser_when_ready(server: "uvicorn.Server", url: str, delay: float) -> None:
+    """等待服务器完成启动后立即打开浏览器（在后台线程中运行）。"""
+    while not server.started and not server.should_exit:
+        time.sleep(0.02)
+    if server.started:
+        if delay > 0:
+            time.sleep(delay)
+        webbrowser.open(url)
 
 
 def parse_args() -> argparse.Namespace:
@@ -34,8 +40,8 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--open-delay",
         type=float,
-        default=1.5,
-        help="打开浏览器前的延迟秒数 (默认: 1.5)",
+        default=0.0,
+        help="服务就绪后额外等待的秒数，再打开浏览器 (默认: 0)",
     )
     parser.add_argument(
         "--log-level",
@@ -49,23 +55,28 @@ def parse_args() -> argparse.Namespace:
 def main() -> None:
     args = parse_args()
 
+    # 解析参数后再导入uvicorn，--help 等情况无需加载服务端依赖
+    import uvicorn
+
     url = f"http://{args.host}:{args.port}/"
     print(f"[video-converter] 启动服务中，完成后可访问: {url}")
 
-    if not args.no_browser:
-        threading.Thread(
-            target=_launch_browser,
-            args=(url, args.open_delay),
-            daemon=True,
-        ).start()
-
-    uvicorn.run(
+    config = uvicorn.Config(
         "video_converter.webapp:app",
         host=args.host,
         port=args.port,
         log_level=args.log_level,
         reload=False,
     )
+    server = uvicorn.Server(config)
+    if not args.no_browser:
+        threading.Thread(
+            target=_open_browser_when_ready,
+            args=(server, url, args.open_delay),
+            daemon=True,
+        ).start()
+    # server.run() 按配置创建事件循环（安装了 uvloop 时使用 uvloop）
+    server.run()
 
 
 if __name__ == "__main__":
@@ -1,16 +1,28 @@
-from setuptools import setup, find_packages
+from setuptools import Extension, setup, find_packages
 
 setup(
     name="video-converter",
     version="1.0.0",
     packages=find_packages(),
     py_modules=["serve_app"],
+    # 可选的C扩展：编译失败（如缺少编译器或非POSIX平台）时回退到纯Python扫描
+    ext_modules=[
+        Extension(
+            "video_converter._scan",
+            sources=["video_converter/_scan.c"],
+            optional=True,
+        ),
+    ],
     install_requires=[
         "tqdm>=4.64.0",
         "fastapi>=0.110.0",
         "uvicorn[standard]>=0.22.0",
         "python-multipart>=0.0.6",
     ],
+    extras_require={
+        # 可选：更快的 JSON 序列化，未安装时 Web 服务使用标准库 json
+        "orjson": ["orjson>=3.6"],
+    },
     entry_points={
         'console_scripts': [
             'video-converter=video_converter.__main__:main',
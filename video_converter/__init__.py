@@ -7,4 +7,12 @@ Python视频格式转换工具包
 __version__ = "1.0.0"
 name = "video_converter"
 
-from video_converter.core.converter import VideoConverter, ConversionConfig, ConversionResult
+__all__ = ["VideoConverter", "ConversionConfig", "ConversionResult"]
+
+
+def __getattr__(attr: str):
+    """按需导入转换器，避免仅解析命令行参数时加载tqdm等依赖"""
+    if attr in __all__:
+        from video_converter.core import converter
+        return getattr(converter, attr)
+    raise AttributeError(f"module {__name__!r} has no attribute {attr!r}")
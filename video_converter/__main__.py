@@ -6,7 +6,7 @@ import logging
 import os
 import sys
 
-from video_converter.core.converter import ConversionConfig, VideoConverter
+from video_converter.core.formats import SUPPORTED_FORMATS_DEFAULT
 
 def create_parser() -> argparse.ArgumentParser:
     """创建命令行参数解析器"""
@@ -31,7 +31,7 @@ def create_parser() -> argparse.ArgumentParser:
     parser.add_argument(
         "-f", "--format",
         default="mp4",
-        choices=ConversionConfig().supported_formats or [],
+        choices=SUPPORTED_FORMATS_DEFAULT,
         help="目标视频格式 (默认: mp4)"
     )
 
@@ -56,6 +56,27 @@ def create_parser() -> argparse.ArgumentParser:
         help="最大并行工作线程数 (默认: 4)"
     )
 
+    parser.add_argument(
+        "--ffmpeg-threads",
+        type=int,
+        default=0,
+        help="每个ffmpeg进程使用的线程数，设置后会据此自动限制并行数 (默认: 0，由ffmpeg决定)"
+    )
+
+    parser.add_argument(
+        "--hw",
+        action="store_true",
+        dest="prefer_hw",
+        help="重新编码时优先使用硬件编码器 (NVENC/QSV/VideoToolbox)"
+    )
+
+    parser.add_argument(
+        "--fuse",
+        action="store_true",
+        dest="fuse_encodes",
+        help="文件夹中至少4个文件需要重新编码时，合并到同一ffmpeg进程中编码"
+    )
+
     parser.add_argument(
         "--log-level",
         choices=["DEBUG", "INFO", "WARNING", "ERROR"],
@@ -67,6 +88,8 @@ def create_parser() -> argparse.ArgumentParser:
 
 def interactive_mode():
     """交互模式"""
+    from video_converter.core.converter import ConversionConfig, VideoConverter
+
     print("=== 视频格式转换工具 ===")
     
     config = ConversionConfig()
@@ -120,11 +143,18 @@ def interactive_mode():
 
 def cli_mode(args):
     """命令行模式"""
+    from video_converter.core.converter import ConversionConfig, VideoConverter
+
     # 设置日志级别
     logging.getLogger().setLevel(getattr(logging, args.log_level))
 
     # 创建配置和转换器
-    config = ConversionConfig(max_workers=args.max_workers)
+    config = ConversionConfig(
+        max_workers=args.max_workers,
+        ffmpeg_threads=args.ffmpeg_threads,
+        prefer_hw=args.prefer_hw,
+        fuse_encodes=args.fuse_encodes,
+    )
     converter = VideoConverter(config)
 
     input_path = args.input
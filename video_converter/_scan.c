@@ -0,0 +1,273 @@
+/*
+ * 视频文件扫描加速模块
+ *
+ * 使用 opendir/readdir 递归遍历目录，直接在C层比较扩展名，
+ * 只为匹配的文件创建Python对象。行为与 VideoConverter._scan_videos
+ * 的纯Python实现一致：不进入目录的符号链接，指向文件的符号链接按文件处理。
+ *
+ * 目录读取和 lstat 期间释放GIL（网络文件系统上可能很慢），其他线程可以继续运行；
+ * 每处理一个目录项检查一次信号，Ctrl+C 可以中断大目录树的扫描。
+ */
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+
+#include <dirent.h>
+#include <string.h>
+#include <strings.h>
+#include <sys/stat.h>
+#include <sys/types.h>
+
+enum { KIND_FILE, KIND_DIR, KIND_SKIP };
+
+typedef struct {
+    char *buf;
+    size_t len;
+    size_t cap;
+} PathBuffer;
+
+/*
+ * 将 name 拼接到 path->buf 的前 base_len 个字节之后
+ * 可在不持有GIL时调用：内存不足时只返回 -1，由调用方设置异常
+ */
+static int
+path_join(PathBuffer *path, size_t base_len, const char *name, size_t name_len)
+{
+    int need_sep = base_len > 0 && path->buf[base_len - 1] != '/';
+    size_t needed = base_len + need_sep + name_len + 1;
+
+    if (needed > path->cap) {
+        size_t cap = path->cap * 2;
+        while (cap < needed) {
+            cap *= 2;
+        }
+        char *buf = PyMem_RawRealloc(path->buf, cap);
+        if (buf == NULL) {
+            return -1;
+        }
+        path->buf = buf;
+        path->cap = cap;
+    }
+
+    size_t pos = base_len;
+    if (need_sep) {
+        path->buf[pos++] = '/';
+    }
+    memcpy(path->buf + pos, name, name_len);
+    path->len = pos + name_len;
+    path->buf[path->len] = '\0';
+    return 0;
+}
+
+/* 读取下一个目录项，跳过 "." 和 ".." */
+static struct dirent *
+next_entry(DIR *dir)
+{
+    struct dirent *entry;
+
+    while ((entry = readdir(dir)) != NULL) {
+        const char *name = entry->d_name;
+        if (!(name[0] == '.' && (name[1] == '\0' || (name[1] == '.' && name[2] == '\0')))) {
+            break;
+        }
+    }
+    return entry;
+}
+
+static int
+entry_kind(const char *full_path, const struct dirent *entry)
+{
+    struct stat st;
+
+#ifdef DT_DIR
+    if (entry->d_type == DT_DIR) {
+        return KIND_DIR;
+    }
+    if (entry->d_type != DT_LNK && entry->d_type != DT_UNKNOWN) {
+        return KIND_FILE;
+    }
+#endif
+    if (lstat(full_path, &st) != 0) {
+        return KIND_FILE;
+    }
+    if (S_ISDIR(st.st_mode)) {
+        return KIND_DIR;
+    }
+    if (S_ISLNK(st.st_mode) && stat(full_path, &st) == 0 && S_ISDIR(st.st_mode)) {
+        return KIND_SKIP;
+    }
+    return KIND_FILE;
+}
+
+static int
+has_extension(const char *name, size_t name_len, const char **exts, Py_ssize_t n_exts)
+{
+    const char *dot = strrchr(name, '.');
+    if (dot == NULL || dot == name) {
+        return 0;
+    }
+    size_t suffix_len = name_len - (size_t)(dot - name);
+    for (Py_ssize_t i = 0; i < n_exts; i++) {
+        if (strlen(exts[i]) == suffix_len && strcasecmp(dot, exts[i]) == 0) {
+            return 1;
+        }
+    }
+    return 0;
+}
+
+static int
+append_path(PyObject *list, const PathBuffer *path)
+{
+    PyObject *item = PyBytes_FromStringAndSize(path->buf, (Py_ssize_t)path->len);
+    if (item == NULL) {
+        return -1;
+    }
+    int status = PyList_Append(list, item);
+    Py_DECREF(item);
+    return status;
+}
+
+static int
+scan_directory(PathBuffer *path, const char **exts, Py_ssize_t n_exts,
+               PyObject *files, PyObject *unreadable)
+{
+    DIR *dir;
+
+    Py_BEGIN_ALLOW_THREADS
+    dir = opendir(path->buf);
+    Py_END_ALLOW_THREADS
+    if (dir == NULL) {
+        return append_path(unreadable, path);
+    }
+
+    size_t base_len = path->len;
+    int status = 0;
+
+    for (;;) {
+        struct dirent *entry;
+        const char *name = NULL;
+        size_t name_len = 0;
+        int joined = 0;
+        int kind = KIND_SKIP;
+
+        Py_BEGIN_ALLOW_THREADS
+        entry = next_entry(dir);
+        if (entry != NULL) {
+            name = entry->d_name;
+            name_len = strlen(name);
+            joined = path_join(path, base_len, name, name_len);
+            if (joined == 0) {
+                kind = entry_kind(path->buf, entry);
+            }
+        }
+        Py_END_ALLOW_THREADS
+
+        if (entry == NULL) {
+            break;
+        }
+        if (joined < 0) {
+            PyErr_NoMemory();
+            status = -1;
+            break;
+        }
+        if (PyErr_CheckSignals() < 0) {
+            status = -1;
+            break;
+        }
+
+        if (kind == KIND_DIR) {
+            status = scan_directory(path, exts, n_exts, files, unreadable);
+        }
+        else if (kind == KIND_FILE && has_extension(name, name_len, exts, n_exts)) {
+            status = append_path(files, path);
+        }
+        if (status < 0) {
+            break;
+        }
+    }
+
+    Py_BEGIN_ALLOW_THREADS
+    closedir(dir);
+    Py_END_ALLOW_THREADS
+    path->len = base_len;
+    path->buf[base_len] = '\0';
+    return status;
+}
+
+PyDoc_STRVAR(scan_doc,
+"scan(path: bytes, extensions: tuple[bytes, ...]) -> tuple[list[bytes], list[bytes]]\n\n"
+"递归收集 path 下扩展名（含点号，不区分大小写）属于 extensions 的文件，\n"
+"返回 (匹配的文件路径列表, 无法读取的目录列表)。");
+
+static PyObject *
+scan(PyObject *module, PyObject *args)
+{
+    const char *root;
+    Py_ssize_t root_len;
+    PyObject *ext_tuple;
+
+    if (!PyArg_ParseTuple(args, "y#O!:scan", &root, &root_len, &PyTuple_Type, &ext_tuple)) {
+        return NULL;
+    }
+
+    Py_ssize_t n_exts = PyTuple_GET_SIZE(ext_tuple);
+    const char **exts = PyMem_New(const char *, n_exts > 0 ? n_exts : 1);
+    if (exts == NULL) {
+        return PyErr_NoMemory();
+    }
+    for (Py_ssize_t i = 0; i < n_exts; i++) {
+        PyObject *ext = PyTuple_GET_ITEM(ext_tuple, i);
+        if (!PyBytes_Check(ext)) {
+            PyMem_Free(exts);
+            PyErr_SetString(PyExc_TypeError, "extensions must be a tuple of bytes");
+            return NULL;
+        }
+        exts[i] = PyBytes_AS_STRING(ext);
+    }
+
+    PathBuffer path = {NULL, 0, 256};
+    while (path.cap <= (size_t)root_len) {
+        path.cap *= 2;
+    }
+    /* 路径缓冲区会在释放GIL期间扩容，使用不依赖GIL的 Raw 分配器 */
+    path.buf = PyMem_RawMalloc(path.cap);
+    PyObject *files = PyList_New(0);
+    PyObject *unreadable = PyList_New(0);
+    PyObject *result = NULL;
+
+    if (path.buf == NULL) {
+        PyErr_NoMemory();
+    }
+    else if (files != NULL && unreadable != NULL) {
+        memcpy(path.buf, root, (size_t)root_len);
+        path.len = (size_t)root_len;
+        path.buf[path.len] = '\0';
+        if (scan_directory(&path, exts, n_exts, files, unreadable) == 0) {
+            result = PyTuple_Pack(2, files, unreadable);
+        }
+    }
+
+    PyMem_RawFree(path.buf);
+    PyMem_Free(exts);
+    Py_XDECREF(files);
+    Py_XDECREF(unreadable);
+    return result;
+}
+
+static PyMethodDef scan_methods[] = {
+    {"scan", scan, METH_VARARGS, scan_doc},
+    {NULL, NULL, 0, NULL}
+};
+
+static struct PyModuleDef scan_module = {
+    PyModuleDef_HEAD_INIT,
+    "video_converter._scan",
+    "视频文件扫描加速模块",
+    -1,
+    scan_methods
+};
+
+PyMODINIT_FUNC
+PyInit__scan(void)
+{
+    return PyModule_Create(&scan_module);
+}
@@ -2,46 +2,254 @@
 视频转换核心模块
 """
 
+import asyncio
+import atexit
 import os
 import sys
 import datetime
+import itertools
 import subprocess
 import logging
+import logging.handlers
 import json
+import queue
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import OrderedDict
+from typing import List, Dict, FrozenSet, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 import shutil
+import threading
+import time
+from functools import lru_cache
 from tqdm import tqdm
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
+from video_converter.core.formats import SUPPORTED_FORMATS_DEFAULT
+
+try:
+    from video_converter._scan import scan as _native_scan
+except ImportError:  # 未编译C扩展时使用纯Python扫描
+    _native_scan = None
+
+def _configure_logging() -> None:
+    """
+    配置日志：各线程只把日志记录放入队列，由单独的监听线程写入文件和终端，
+    避免并发任务争用文件处理器的锁。与logging.basicConfig一样，根日志已有处理器时不做修改
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return
+
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    handlers = [
         logging.FileHandler('video_conversion.log'),
         logging.StreamHandler()
     ]
-)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(logging.INFO)
+
+
+# 配置日志
+_configure_logging()
 logger = logging.getLogger(__name__)
 
-@dataclass
+# Python 3.10+ 的数据类使用__slots__，省去每个实例的__dict__
+_DATACLASS_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+# 默认支持的视频格式及对应扩展名
+_DEFAULT_FORMATS = SUPPORTED_FORMATS_DEFAULT
+_DEFAULT_EXTENSIONS = tuple(f".{fmt}" for fmt in _DEFAULT_FORMATS)
+# 扫描目录时以bytes形式比较扩展名，避免为每个目录项解码和分配字符串
+_DEFAULT_EXTENSION_SET = frozenset(os.fsencode(ext) for ext in _DEFAULT_EXTENSIONS)
+
+# 目标容器的流复制规则: (确定可复制的视频编码, 确定可复制的音频编码, 确定会被封装器拒绝的编码)
+# 第三项为None表示封装器只接受前两项列出的编码；不在任何列表中的编码无法预先判断，仍会先尝试复制
+_MP4_VIDEO_CODECS = frozenset({
+    "h264", "hevc", "av1", "mpeg4", "vp9", "mpeg1video", "mpeg2video", "mjpeg", "png", "vc1",
+})
+# TrueHD（以及 ffmpeg 6.0 之前的 Opus、FLAC）需要 -strict experimental 才能写入，不算确定可复制
+_MP4_AUDIO_CODECS = frozenset({"aac", "mp3", "mp2", "ac3", "eac3", "dts", "alac"})
+_MOV_VIDEO_CODECS = _MP4_VIDEO_CODECS | frozenset({"prores", "dnxhd", "h263", "qtrle", "rawvideo"})
+_MOV_AUDIO_CODECS = _MP4_AUDIO_CODECS | frozenset({
+    "pcm_u8", "pcm_s16le", "pcm_s16be", "pcm_s24le", "pcm_s24be", "pcm_s32le", "pcm_s32be",
+    "pcm_f32le", "pcm_f32be", "pcm_f64le", "pcm_f64be", "pcm_alaw", "pcm_mulaw",
+})
+# mp4/mov封装器不支持的常见旧编码（WMV、FLV、RealMedia）
+_MP4_REJECTED_CODECS = frozenset({
+    "wmv1", "wmv2", "wmv3", "flv1", "vp6", "vp6f", "rv10", "rv20", "rv30", "rv40",
+    "wmav1", "wmav2", "wmapro", "cook", "nellymoser", "sipr",
+})
+_STREAM_COPY_CODECS: Dict[str, Tuple[FrozenSet[str], FrozenSet[str], Optional[FrozenSet[str]]]] = {
+    "mp4": (_MP4_VIDEO_CODECS, _MP4_AUDIO_CODECS, _MP4_REJECTED_CODECS),
+    "m4v": (frozenset({"h264", "hevc", "mpeg4"}), frozenset({"aac", "mp3", "ac3", "eac3", "alac"}),
+            _MP4_REJECTED_CODECS),
+    "mov": (_MOV_VIDEO_CODECS, _MOV_AUDIO_CODECS, _MP4_REJECTED_CODECS),
+    "webm": (frozenset({"vp8", "vp9", "av1"}), frozenset({"opus", "vorbis"}), None),
+}
+
+# 可以边转换边输出到管道的目标格式及其封装参数（mp4/mov使用分片封装，无需回写文件头）
+_FRAGMENTED_MOVFLAGS = ("-movflags", "frag_keyframe+empty_moov+default_base_moof")
+_STREAM_MUXERS: Dict[str, Tuple[str, ...]] = {
+    "mp4": ("-f", "mp4", *_FRAGMENTED_MOVFLAGS),
+    "mov": ("-f", "mov", *_FRAGMENTED_MOVFLAGS),
+    "mkv": ("-f", "matroska"),
+    "webm": ("-f", "webm"),
+}
+# Matroska几乎可以封装任何编码，流式输出时只要未确定不兼容就直接复制流
+_STREAM_COPY_ANY = frozenset({"mkv"})
+
+# 每次从ffmpeg stderr读取的最大字节数，以及失败时保留的stderr末尾字节数
+_PIPE_BUFFER_SIZE = 1 << 20
+_STDERR_TAIL_BYTES = 64 * 1024
+
+# 启用合并编码所需的最少文件数
+_MIN_FUSED_ENCODES = 4
+
+
+def _stream_maps(index: int) -> Tuple[str, ...]:
+    """
+    第index个输入要输出的流：第一个视频流（V不含内嵌封面图片）和第一个音频流
+    单文件和批量转换使用相同的映射，与编码探测选取的流一致，结果不受是否合并批量影响
+    """
+    return ("-map", f"{index}:V:0?", "-map", f"{index}:a:0?")
+
+# 进度条的最小刷新间隔（秒）
+_PROGRESS_INTERVAL = 0.25
+
+# 并发扫描目录使用的线程数
+_SCAN_WORKERS = 8
+
+# ffprobe探测结果缓存条目上限
+_PROBE_CACHE_SIZE = 1024
+
+ProbeInfo = Tuple[Optional[str], Optional[str], Optional[str]]
+
+# 测试硬件编码器是否可用的超时时间（秒）
+_HW_PROBE_TIMEOUT = 15
+
+# 各目标格式可用的硬件视频编码器，按优先级排列
+# （h264_vaapi需要指定设备并用hwupload上传帧，无法直接替换编码器使用，因此不在列表中）
+_H264_HW_ENCODERS = ("h264_nvenc", "h264_qsv", "h264_videotoolbox")
+_HW_VIDEO_ENCODERS: Dict[str, Tuple[str, ...]] = {
+    fmt: _H264_HW_ENCODERS for fmt in ("mp4", "mkv", "mov", "m4v", "flv")
+}
+
+
+# 输出文件名中的递增序号，以及按秒缓存的时间戳字符串
+_OUTPUT_SEQUENCE = itertools.count(1)
+_timestamp_cache: Tuple[int, str] = (0, "")
+
+
+def _output_timestamp() -> str:
+    """返回当前时间戳字符串，同一秒内复用已格式化的结果"""
+    global _timestamp_cache
+    second = int(time.time())
+    cached_second, timestamp = _timestamp_cache
+    if cached_second != second:
+        timestamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(second))
+        _timestamp_cache = (second, timestamp)
+    return timestamp
+
+
+def generate_output_path(input_path: str, target_format: str) -> str:
+    """
+    生成输出文件路径，附加时间戳、进程号和进程内递增序号
+    序号只在本进程内递增，加上进程号后多个CLI或Web工作进程同一秒内生成的文件名也不会相互覆盖
+    """
+    file_root, _ = os.path.splitext(input_path)
+    return f"{file_root}_{_output_timestamp()}_{os.getpid()}_{next(_OUTPUT_SEQUENCE)}.{target_format}"
+
+
+@lru_cache(maxsize=None)
+def _format_suffix(target_format: str) -> str:
+    """返回目标格式对应的小写扩展名，例如 mp4 对应 .mp4"""
+    return f".{target_format.lower()}"
+
+
+def _hw_encoder_works(ffmpeg: str, encoder: str) -> bool:
+    """用硬件编码器试编码一帧测试画面，确认本机确实有可用的硬件和驱动"""
+    cmd = [
+        ffmpeg, "-hide_banner", "-nostdin", "-loglevel", "error",
+        "-f", "lavfi", "-i", "nullsrc=s=256x256:d=1",
+        "-frames:v", "1", "-c:v", encoder, "-f", "null", "-",
+    ]
+    try:
+        subprocess.run(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=_HW_PROBE_TIMEOUT,
+            check=True
+        )
+    except (OSError, subprocess.SubprocessError):
+        return False
+    return True
+
+
+@lru_cache(maxsize=None)
+def _detect_encoders(ffmpeg: str) -> FrozenSet[str]:
+    """
+    查询当前ffmpeg可用的编码器列表（每个进程只执行一次）
+    编译进ffmpeg的硬件编码器不代表本机有对应硬件，因此各试编码一帧，失败的不计入结果
+    """
+    try:
+        result = subprocess.run(
+            [ffmpeg, "-hide_banner", "-encoders"],
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            text=True,
+            check=True
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning(f"无法获取ffmpeg编码器列表: {e}")
+        return frozenset()
+
+    encoders = set()
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        # 编码器行格式: " V....D h264_nvenc  NVIDIA NVENC H.264 encoder"
+        if len(parts) >= 2 and len(parts[0]) == 6 and parts[1] != "=":
+            encoders.add(parts[1])
+
+    hw_candidates = {name for names in _HW_VIDEO_ENCODERS.values() for name in names} & encoders
+    for encoder in sorted(hw_candidates):
+        if not _hw_encoder_works(ffmpeg, encoder):
+            logger.info(f"硬件编码器 {encoder} 不可用，已跳过")
+            encoders.discard(encoder)
+    return frozenset(encoders)
+
+@dataclass(frozen=True, **_DATACLASS_SLOTS)
 class ConversionConfig:
-    """视频转换配置类"""
+    """视频转换配置类（创建后不可修改）"""
     supported_formats: Optional[List[str]] = None
     supported_extensions: Optional[List[str]] = None
     default_video_codec: str = "libx264"
     default_audio_codec: str = "aac"
     max_workers: int = 4
+    ffmpeg_threads: int = 0  # 每个ffmpeg进程的线程数，0表示由ffmpeg自行决定
+    prefer_hw: bool = False  # 重新编码时优先使用可用的硬件视频编码器
+    batch_size: int = 16  # 批量转换时单个ffmpeg进程处理的最大文件数，1表示禁用批量
+    fuse_encodes: bool = False  # 将需要重新编码的文件合并到同一ffmpeg进程中编码
     
     def __post_init__(self):
+        # 冻结的数据类需要通过object.__setattr__填充默认值
         if self.supported_formats is None:
-            self.supported_formats = ["mp4", "mkv", "avi", "mov", "flv", "wmv", "webm", "mpeg", "m4v"]
+            object.__setattr__(self, "supported_formats", list(_DEFAULT_FORMATS))
+            if self.supported_extensions is None:
+                object.__setattr__(self, "supported_extensions", list(_DEFAULT_EXTENSIONS))
         if self.supported_extensions is None:
-            self.supported_extensions = [f".{fmt}" for fmt in self.supported_formats]
+            object.__setattr__(self, "supported_extensions", [f".{fmt}" for fmt in self.supported_formats])
 
-@dataclass
+@dataclass(frozen=True, **_DATACLASS_SLOTS)
 class ConversionResult:
     """转换结果类"""
     success: bool
@@ -55,44 +263,217 @@ class VideoConverter:
     
     def __init__(self, config: Optional[ConversionConfig] = None):
         self.config = config or ConversionConfig()
-        self._check_ffmpeg()
+        self._ffmpeg = self._check_ffmpeg()
+        # 每次启动ffmpeg都使用的固定参数：绝对路径避免逐个搜索PATH，并关闭横幅输出与交互输入
+        self._ffmpeg_prefix = [self._ffmpeg, "-hide_banner", "-nostdin"]
+        # 单文件转换的命令模板，None处依次填入输入路径和输出路径（配置不可变，模板可一直复用）
+        self._copy_template: Tuple[Optional[str], ...] = (
+            *self._ffmpeg_prefix, "-i", None, *_stream_maps(0), *self._thread_args(), "-c", "copy", "-y", None
+        )
+        self._encode_templates: Dict[str, Tuple[Optional[str], ...]] = {}
+        if self.config.prefer_hw:
+            # 在启动并发任务之前探测编码器，避免多个线程重复查询
+            _detect_encoders(self._ffmpeg)
+        self._formats = frozenset(self.config.supported_formats or [])
+        self._extensions = self._build_extension_set(self.config.supported_extensions)
+        self._ffprobe = shutil.which("ffprobe")
+        self._probe_cache: "OrderedDict[Tuple[str, int, int], ProbeInfo]" = OrderedDict()
+        self._probe_lock = threading.Lock()
     
-    def _check_ffmpeg(self) -> bool:
-        """检查ffmpeg是否可用"""
-        if not shutil.which("ffmpeg"):
+    @staticmethod
+    def _build_extension_set(extensions: Optional[List[str]]) -> FrozenSet[bytes]:
+        """构建小写扩展名的bytes集合，默认配置直接复用模块级常量"""
+        if extensions is None:
+            return frozenset()
+        if tuple(extensions) == _DEFAULT_EXTENSIONS:
+            return _DEFAULT_EXTENSION_SET
+        return frozenset(os.fsencode(ext.lower()) for ext in extensions)
+
+    def _check_ffmpeg(self) -> str:
+        """检查ffmpeg是否可用，返回其绝对路径"""
+        ffmpeg = shutil.which("ffmpeg")
+        if not ffmpeg:
             logger.error("ffmpeg未找到，请确保已安装ffmpeg并添加到PATH中")
             sys.exit(1)
-        return True
+        return ffmpeg
     
+    async def _probe_codecs(self, path: str) -> Optional[ProbeInfo]:
+        """
+        使用ffprobe读取文件的视频编码、音频编码和容器格式
+        结果按 (路径, 修改时间, 文件大小) 缓存，ffprobe不可用或探测失败时返回None
+        """
+        if self._ffprobe is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        with self._probe_lock:
+            cached = self._probe_cache.get(key)
+            if cached is not None:
+                self._probe_cache.move_to_end(key)
+                return cached
+
+        cmd = [self._ffprobe, "-v", "error", "-print_format", "json", "-show_streams", "-show_format", path]
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+            stdout, stderr = await process.communicate()
+        except OSError as e:
+            logger.debug(f"ffprobe启动失败 {path}: {e}")
+            return None
+        if process.returncode != 0:
+            logger.debug(f"ffprobe探测失败 {path}: {stderr.decode(errors='replace').strip()}")
+            return None
+        try:
+            data = json.loads(stdout)
+        except ValueError as e:
+            logger.debug(f"ffprobe输出解析失败 {path}: {e}")
+            return None
+
+        video_codec = audio_codec = None
+        for stream in data.get("streams", []):
+            codec_type = stream.get("codec_type")
+            if codec_type == "video" and video_codec is None:
+                # 跳过内嵌封面图片
+                if not stream.get("disposition", {}).get("attached_pic"):
+                    video_codec = stream.get("codec_name")
+            elif codec_type == "audio" and audio_codec is None:
+                audio_codec = stream.get("codec_name")
+        info = (video_codec, audio_codec, data.get("format", {}).get("format_name"))
+
+        with self._probe_lock:
+            self._probe_cache[key] = info
+            if len(self._probe_cache) > _PROBE_CACHE_SIZE:
+                self._probe_cache.popitem(last=False)
+        return info
+
+    async def _can_stream_copy(self, input_path: str, target_format: str) -> Optional[bool]:
+        """
+        根据探测到的编码判断能否直接复制流
+        只有确定会被目标封装器拒绝时返回False；编码都在可复制列表中时返回True；无法判断时返回None
+        """
+        rule = _STREAM_COPY_CODECS.get(target_format)
+        if rule is None:
+            return None
+        info = await self._probe_codecs(input_path)
+        if info is None:
+            return None
+        video_codec, audio_codec, _ = info
+        allowed_video, allowed_audio, rejected = rule
+        video_ok = video_codec is None or video_codec in allowed_video
+        audio_ok = audio_codec is None or audio_codec in allowed_audio
+        if video_ok and audio_ok:
+            return True
+        if rejected is None:
+            return False
+        if video_codec in rejected or audio_codec in rejected:
+            return False
+        return None
+
+    def _video_encoders(self, target_format: str) -> List[str]:
+        """返回重新编码时依次尝试的视频编码器，默认软件编码器总是最后一个"""
+        encoders = []
+        if self.config.prefer_hw:
+            available = _detect_encoders(self._ffmpeg)
+            encoders = [name for name in _HW_VIDEO_ENCODERS.get(target_format, ()) if name in available]
+        encoders.append(self.config.default_video_codec)
+        return encoders
+
     def _is_same_format(self, input_path: str, target_format: str) -> bool:
-        """检查输入文件是否已经是目标格式"""
-        _, file_ext = os.path.splitext(input_path)
-        return file_ext.lower().lstrip('.') == target_format.lower()
+        """检查输入文件是否已经是目标格式（只比较路径末尾的扩展名）"""
+        suffix = _format_suffix(target_format)
+        return input_path[-len(suffix):].lower() == suffix
     
     def _generate_output_path(self, input_path: str, target_format: str) -> str:
-        """生成输出文件路径"""
-        file_root, _ = os.path.splitext(input_path)
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        return f"{file_root}_{timestamp}.{target_format}"
+        """生成输出文件路径（见generate_output_path）"""
+        return generate_output_path(input_path, target_format)
     
-    def _run_ffmpeg_command(self, cmd: List[str], input_path: str) -> bool:
-        """执行ffmpeg命令"""
+    def _thread_args(self) -> List[str]:
+        """生成ffmpeg线程数参数"""
+        if self.config.ffmpeg_threads > 0:
+            return ["-threads", str(self.config.ffmpeg_threads)]
+        return []
+
+    def _encode_template(self, video_codec: str) -> Tuple[Optional[str], ...]:
+        """返回使用指定视频编码器重新编码的命令模板，首次使用时生成并缓存"""
+        template = self._encode_templates.get(video_codec)
+        if template is None:
+            hwaccel = ("-hwaccel", "auto") if video_codec != self.config.default_video_codec else ()
+            template = (
+                *self._ffmpeg_prefix, *hwaccel,
+                "-i", None,
+                *_stream_maps(0),
+                *self._thread_args(),
+                "-c:v", video_codec,
+                "-c:a", self.config.default_audio_codec,
+                "-y", None
+            )
+            self._encode_templates[video_codec] = template
+        return template
+
+    @staticmethod
+    def _fill_template(template: Tuple[Optional[str], ...], input_path: str, output_file: str) -> List[str]:
+        """用输入和输出路径填充命令模板"""
+        cmd = list(template)
+        cmd[cmd.index(None)] = input_path
+        cmd[-1] = output_file
+        return cmd
+
+    def _resolve_workers(self) -> int:
+        """根据ffmpeg线程数计算并行任务数，避免CPU超额订阅"""
+        if self.config.ffmpeg_threads <= 0:
+            return max(1, self.config.max_workers)
+        cpu_count = os.cpu_count() or 4
+        return max(1, min(self.config.max_workers, cpu_count // self.config.ffmpeg_threads))
+
+    async def _run_ffmpeg_command(self, cmd: List[str], input_path: str) -> bool:
+        """执行ffmpeg命令，运行期间持续读取stderr，只保留末尾部分用于错误信息"""
         try:
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                check=True
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE
             )
-            logger.debug(f"ffmpeg命令执行成功: {' '.join(cmd)}")
-            return True
-        except subprocess.CalledProcessError as e:
-            logger.error(f"ffmpeg命令执行失败: {e.stderr}")
+        except OSError as e:
+            logger.error(f"ffmpeg启动失败: {e}")
+            return False
+
+        stderr_tail = bytearray()
+        while chunk := await process.stderr.read(_PIPE_BUFFER_SIZE):
+            stderr_tail += chunk
+            del stderr_tail[:-_STDERR_TAIL_BYTES]
+        returncode = await process.wait()
+
+        if returncode != 0:
+            logger.error(f"ffmpeg命令执行失败: {stderr_tail.decode(errors='replace')}")
             return False
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"ffmpeg命令执行成功: {' '.join(cmd)}")
+        return True
     
     def convert_video(self, input_path: str, target_format: str = "mp4") -> ConversionResult:
         """
         转换单个视频文件到指定格式
+        内部使用asyncio驱动ffmpeg子进程，不能在运行中的事件循环内调用，异步代码请使用convert_video_async
+        Args:
+            input_path (str): 输入视频文件路径
+            target_format (str): 目标视频格式
+        Returns:
+            ConversionResult: 转换结果
+        """
+        return asyncio.run(self.convert_video_async(input_path, target_format))
+
+    async def convert_video_async(self, input_path: str, target_format: str = "mp4") -> ConversionResult:
+        """
+        convert_video的异步版本
         Args:
             input_path (str): 输入视频文件路径
             target_format (str): 目标视频格式
@@ -102,7 +483,7 @@ class VideoConverter:
         start_time = datetime.datetime.now()
         
         # 验证目标格式
-        if target_format not in (self.config.supported_formats or []):
+        if target_format not in self._formats:
             error_msg = f"不支持的目标格式: {target_format}. 支持的格式: {', '.join(self.config.supported_formats or [])}"
             logger.error(error_msg)
             return ConversionResult(False, input_path, error_message=error_msg)
@@ -122,33 +503,58 @@ class VideoConverter:
         # 生成输出文件路径
         output_file = self._generate_output_path(input_path, target_format)
         
-        # 尝试直接复制流（速度更快）
         logger.info(f"开始转换 {input_path} 到 {output_file}")
-        copy_cmd = ["ffmpeg", "-i", input_path, "-c", "copy", "-y", output_file]
-        
-        if self._run_ffmpeg_command(copy_cmd, input_path):
-            processing_time = (datetime.datetime.now() - start_time).total_seconds()
-            logger.info(f"转换完成: {output_file} (用时: {processing_time:.2f}秒)")
-            return ConversionResult(True, input_path, output_file, processing_time=processing_time)
-        
-        # 如果直接复制失败，尝试重新编码
-        logger.warning(f"直接转换失败，开始重新编码 {input_path}")
-        encode_cmd = [
-            "ffmpeg", "-i", input_path, 
-            "-c:v", self.config.default_video_codec, 
-            "-c:a", self.config.default_audio_codec, 
-            "-y", output_file
-        ]
-        
-        if self._run_ffmpeg_command(encode_cmd, input_path):
-            processing_time = (datetime.datetime.now() - start_time).total_seconds()
-            logger.info(f"重新编码完成: {output_file} (用时: {processing_time:.2f}秒)")
-            return ConversionResult(True, input_path, output_file, processing_time=processing_time)
+
+        # 先探测编码，已知无法直接复制流时跳过注定失败的复制尝试
+        if await self._can_stream_copy(input_path, target_format) is False:
+            logger.info(f"源编码与 {target_format} 不兼容，直接重新编码 {input_path}")
         else:
-            error_msg = f"转换失败: {input_path}"
-            logger.error(error_msg)
-            return ConversionResult(False, input_path, error_message=error_msg)
+            # 尝试直接复制流（速度更快）
+            copy_cmd = self._fill_template(self._copy_template, input_path, output_file)
+
+            if await self._run_ffmpeg_command(copy_cmd, input_path):
+                processing_time = (datetime.datetime.now() - start_time).total_seconds()
+                logger.info(f"转换完成: {output_file} (用时: {processing_time:.2f}秒)")
+                return ConversionResult(True, input_path, output_file, processing_time=processing_time)
+
+            # 如果直接复制失败，尝试重新编码
+            logger.warning(f"直接转换失败，开始重新编码 {input_path}")
+        # 按优先级依次尝试可用的硬件编码器，最后使用默认软件编码器
+        for video_codec in self._video_encoders(target_format):
+            encode_cmd = self._fill_template(self._encode_template(video_codec), input_path, output_file)
+
+            if await self._run_ffmpeg_command(encode_cmd, input_path):
+                processing_time = (datetime.datetime.now() - start_time).total_seconds()
+                logger.info(f"重新编码完成: {output_file} (编码器: {video_codec}, 用时: {processing_time:.2f}秒)")
+                return ConversionResult(True, input_path, output_file, processing_time=processing_time)
+            logger.warning(f"使用 {video_codec} 重新编码失败: {input_path}")
+
+        error_msg = f"转换失败: {input_path}"
+        logger.error(error_msg)
+        return ConversionResult(False, input_path, error_message=error_msg)
     
+    async def build_stream_command(self, input_path: str, target_format: str) -> Optional[List[str]]:
+        """
+        生成把转换结果写到标准输出（pipe:1）的ffmpeg命令，用于边转换边发送
+        输出到管道后无法在失败时改用重新编码重试，因此只有探测确认编码兼容时才直接复制流（mkv除外）
+        Args:
+            input_path (str): 输入视频文件路径
+            target_format (str): 目标视频格式
+        Returns:
+            Optional[List[str]]: ffmpeg命令；目标格式不支持流式输出时返回None
+        """
+        muxer = _STREAM_MUXERS.get(target_format)
+        if muxer is None or target_format not in self._formats:
+            return None
+        can_copy = await self._can_stream_copy(input_path, target_format)
+        if can_copy or (can_copy is None and target_format in _STREAM_COPY_ANY):
+            template = self._copy_template
+        else:
+            template = self._encode_template(self._video_encoders(target_format)[0])
+        cmd = self._fill_template(template, input_path, "pipe:1")
+        cmd[-1:-1] = muxer
+        return cmd
+
     def convert_folder(self, folder_path: str, target_format: str = "mp4", use_parallel: bool = True) -> List[ConversionResult]:
         """
         转换文件夹中的所有视频文件
@@ -159,64 +565,231 @@ class VideoConverter:
         Returns:
             List[ConversionResult]: 转换结果列表
         """
+        target_format = target_format.lower()
         if not os.path.isdir(folder_path):
             error_msg = f"文件夹不存在: {folder_path}"
             logger.error(error_msg)
             return [ConversionResult(False, folder_path, error_message=error_msg)]
         
         # 收集所有视频文件
-        video_files = []
-        for root, _, files in os.walk(folder_path):
-            for file in files:
-                file_path = os.path.join(root, file)
-                file_ext = os.path.splitext(file)[-1].lower()
-                if file_ext in (self.config.supported_extensions or []):
-                    video_files.append(file_path)
+        video_files = self._scan_videos(folder_path)
         
         if not video_files:
             logger.warning(f"在 {folder_path} 中未找到支持的视频文件")
             return []
         
         logger.info(f"找到 {len(video_files)} 个视频文件")
-        results = []
         
         if use_parallel and len(video_files) > 1:
             # 并行处理
-            with ThreadPoolExecutor(max_workers=self.config.max_workers) as executor:
-                future_to_file = {
-                    executor.submit(self.convert_video, file_path, target_format): file_path 
-                    for file_path in video_files
-                }
-                
-                with tqdm(total=len(video_files), desc="转换进度") as pbar:
-                    for future in as_completed(future_to_file):
-                        result = future.result()
-                        results.append(result)
-                        pbar.update(1)
-                        
-                        if result.success:
-                            pbar.set_postfix({"最近完成": os.path.basename(result.input_path)})
+            workers = self._resolve_workers()
+            logger.info(f"并行任务数: {workers}")
         else:
             # 顺序处理
-            with tqdm(video_files, desc="转换进度") as pbar:
-                for file_path in pbar:
-                    pbar.set_postfix({"当前": os.path.basename(file_path)})
-                    result = self.convert_video(file_path, target_format)
-                    results.append(result)
+            workers = 1
+        return asyncio.run(self._convert_files(video_files, target_format, workers))
+
+    async def _convert_files(self, video_files: List[str], target_format: str, workers: int) -> List[ConversionResult]:
+        """
+        在单个事件循环中驱动所有ffmpeg子进程，用信号量限制同时运行的任务数
+        Args:
+            video_files (List[str]): 待转换的文件列表
+            target_format (str): 目标格式
+            workers (int): 同时运行的最大任务数
+        Returns:
+            List[ConversionResult]: 转换结果列表
+        """
+        semaphore = asyncio.Semaphore(workers)
+        jobs = await self._plan_jobs(video_files, target_format, workers, semaphore)
+
+        async def run_job(files: List[str], encode: bool) -> List[ConversionResult]:
+            async with semaphore:
+                return await self._convert_batch(files, target_format, encode)
+
+        results: List[ConversionResult] = []
+        with tqdm(total=len(video_files), desc="转换进度", mininterval=_PROGRESS_INTERVAL) as pbar:
+            last_refresh = 0.0
+            for next_done in asyncio.as_completed([run_job(files, encode) for files, encode in jobs]):
+                batch_results = await next_done
+                results.extend(batch_results)
+                
+                # 限制后缀信息的刷新频率，由update统一输出
+                now = time.monotonic()
+                if batch_results[-1].success and now - last_refresh >= _PROGRESS_INTERVAL:
+                    pbar.set_postfix({"最近完成": os.path.basename(batch_results[-1].input_path)}, refresh=False)
+                    last_refresh = now
+                pbar.update(len(batch_results))
         
         return results
+
+    def _scan_videos(self, folder_path: str) -> List[str]:
+        """
+        递归收集文件夹中支持的视频文件（不进入目录的符号链接）
+        优先使用C扩展扫描；否则按层级遍历目录树，同一层级的多个目录由线程池并发读取
+        """
+        if _native_scan is not None:
+            files, unreadable = _native_scan(os.fsencode(folder_path), tuple(self._extensions))
+            for directory in unreadable:
+                logger.warning(f"无法读取目录 {os.fsdecode(directory)}")
+            return [os.fsdecode(path) for path in files]
+
+        video_files: List[str] = []
+        pending = [os.fsencode(folder_path)]
+        with ThreadPoolExecutor(max_workers=_SCAN_WORKERS) as executor:
+            while pending:
+                if len(pending) == 1:
+                    listings = [self._scan_directory(pending[0])]
+                else:
+                    listings = executor.map(self._scan_directory, pending)
+                pending = []
+                for files, subdirs in listings:
+                    video_files.extend(files)
+                    pending.extend(subdirs)
+        return video_files
+
+    def _scan_directory(self, directory: bytes) -> Tuple[List[str], List[bytes]]:
+        """
+        读取单个目录，返回其中的视频文件和子目录
+        以bytes路径调用os.scandir，目录项名称无需解码，只有匹配的文件才转换为str
+        """
+        extensions = self._extensions
+        files: List[str] = []
+        subdirs: List[bytes] = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        if not entry.is_symlink():
+                            subdirs.append(entry.path)
+                        continue
+                    name = entry.name
+                    dot = name.rfind(b".")
+                    if dot > 0 and name[dot:].lower() in extensions:
+                        files.append(os.fsdecode(entry.path))
+        except OSError as e:
+            logger.warning(f"无法读取目录 {os.fsdecode(directory)}: {e}")
+        return files, subdirs
+
+    async def _plan_jobs(self, video_files: List[str], target_format: str, workers: int,
+                         semaphore: asyncio.Semaphore) -> List[Tuple[List[str], bool]]:
+        """
+        规划转换任务：可直接流复制且编码相同的同扩展名文件合并为批量任务；
+        启用fuse_encodes时，需要重新编码的文件也合并为批量编码任务；其余文件单独转换
+        Args:
+            video_files (List[str]): 待转换的文件列表
+            target_format (str): 目标格式
+            workers (int): 并行任务数，用于切分批量任务以保持并行度
+            semaphore (asyncio.Semaphore): 限制同时运行的ffprobe进程数
+        Returns:
+            List[Tuple[List[str], bool]]: 每个任务包含的文件列表，以及是否为批量编码任务
+        """
+        jobs: List[Tuple[List[str], bool]] = []
+        candidates: List[str] = []
+        for file_path in video_files:
+            if self.config.batch_size > 1 and target_format in _STREAM_COPY_CODECS \
+                    and not self._is_same_format(file_path, target_format):
+                candidates.append(file_path)
+            else:
+                jobs.append(([file_path], False))
+
+        # 按 (扩展名, 视频编码, 音频编码) 分组，同一批次的输入共享相同的解复用与编码参数
+        buckets: Dict[Tuple[str, Optional[str], Optional[str]], List[str]] = {}
+        encode_files: List[str] = []
+        async def probe(path: str) -> Optional[bool]:
+            async with semaphore:
+                return await self._can_stream_copy(path, target_format)
+
+        copyable = await asyncio.gather(*(probe(file_path) for file_path in candidates))
+        for file_path, can_copy in zip(candidates, copyable):
+            if can_copy:
+                video_codec, audio_codec, _ = await self._probe_codecs(file_path) or (None, None, None)
+                key = (os.path.splitext(file_path)[1].lower(), video_codec, audio_codec)
+                buckets.setdefault(key, []).append(file_path)
+            elif can_copy is False and self.config.fuse_encodes:
+                encode_files.append(file_path)
+            else:
+                jobs.append(([file_path], False))
+
+        for files in buckets.values():
+            jobs.extend((chunk, False) for chunk in self._split_batches(files, workers))
+
+        if len(encode_files) >= _MIN_FUSED_ENCODES:
+            jobs.extend((chunk, True) for chunk in self._split_batches(encode_files, workers))
+        else:
+            jobs.extend(([file_path], False) for file_path in encode_files)
+        return jobs
+
+    def _split_batches(self, files: List[str], workers: int) -> List[List[str]]:
+        """按batch_size切分批量任务，同时保证每个工作线程都能分到任务"""
+        chunk_size = max(1, min(self.config.batch_size, -(-len(files) // workers)))
+        return [files[i:i + chunk_size] for i in range(0, len(files), chunk_size)]
+
+    async def _convert_batch(self, files: List[str], target_format: str, encode: bool = False) -> List[ConversionResult]:
+        """
+        在单个ffmpeg进程中批量转换多个文件（多输入、多输出），节省重复的进程启动与编解码器初始化开销
+        encode为False时直接流复制，为True时使用首选编码器重新编码
+        批量转换失败时删除部分输出并逐个文件回退到convert_video
+        """
+        if len(files) == 1:
+            return [await self.convert_video_async(files[0], target_format)]
+
+        start_time = datetime.datetime.now()
+        output_files = [self._generate_output_path(file_path, target_format) for file_path in files]
+        if encode:
+            video_codec = self._video_encoders(target_format)[0]
+            input_args = ["-hwaccel", "auto"] if video_codec != self.config.default_video_codec else []
+            codec_args = [
+                *self._thread_args(),
+                "-c:v", video_codec,
+                "-c:a", self.config.default_audio_codec
+            ]
+        else:
+            input_args = []
+            codec_args = ["-c", "copy"]
+
+        cmd = [*self._ffmpeg_prefix, "-y"]
+        for file_path in files:
+            cmd += [*input_args, "-i", file_path]
+        for index, output_file in enumerate(output_files):
+            cmd += [*_stream_maps(index), *codec_args, output_file]
+
+        mode = "编码" if encode else "转换"
+        logger.info(f"开始批量{mode} {len(files)} 个文件")
+        if await self._run_ffmpeg_command(cmd, files[0]):
+            processing_time = (datetime.datetime.now() - start_time).total_seconds()
+            logger.info(f"批量{mode}完成: {len(files)} 个文件 (用时: {processing_time:.2f}秒)")
+            per_file_time = processing_time / len(files)
+            return [
+                ConversionResult(True, file_path, output_file, processing_time=per_file_time)
+                for file_path, output_file in zip(files, output_files)
+            ]
+
+        logger.warning(f"批量{mode}失败，逐个转换 {len(files)} 个文件")
+        for output_file in output_files:
+            try:
+                os.remove(output_file)
+            except OSError:
+                pass
+        return [await self.convert_video_async(file_path, target_format) for file_path in files]
     
     def get_conversion_stats(self, results: List[ConversionResult]) -> Dict[str, float]:
         """获取转换统计信息"""
-        successful = [r for r in results if r.success]
-        failed = [r for r in results if not r.success]
-        total_time = sum(r.processing_time for r in successful if r.processing_time)
+        total = successful = failed = 0
+        total_time = 0.0
+        for r in results:
+            total += 1
+            if r.success:
+                successful += 1
+                if r.processing_time:
+                    total_time += r.processing_time
+            else:
+                failed += 1
         
         return {
-            "total_files": len(results),
-            "successful": len(successful),
-            "failed": len(failed),
-            "success_rate": len(successful) / len(results) * 100 if results else 0,
+            "total_files": total,
+            "successful": successful,
+            "failed": failed,
+            "success_rate": successful / total * 100 if total else 0,
             "total_processing_time": total_time,
-            "average_time_per_file": total_time / len(successful) if successful else 0
+            "average_time_per_file": total_time / successful if successful else 0
         }
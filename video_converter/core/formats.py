@@ -0,0 +1,5 @@
+"""
+支持的视频格式常量（不依赖转换器的其他模块，可在命令行解析阶段快速导入）
+"""
+
+SUPPORTED_FORMATS_DEFAULT = ("mp4", "mkv", "avi", "mov", "flv", "wmv", "webm", "mpeg", "m4v")
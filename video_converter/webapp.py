@@ -3,11 +3,23 @@ FastAPI 应用：提供文件上传转换接口并托管前端页面。
 """
 from __future__ import annotations
 
+import asyncio
+import errno
+import functools
+import gzip
+import hashlib
+import json
 import logging
+import os
 import shutil
+import subprocess
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Any, AsyncIterator, BinaryIO, Callable, Dict, Optional, Tuple
+from urllib.parse import quote
 
 from fastapi import (
     BackgroundTasks,
@@ -15,14 +27,32 @@ from fastapi import (
     File,
     Form,
     HTTPException,
+    Request,
     UploadFile,
 )
 from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse, Response
+from fastapi.responses import (
+    FileResponse,
+    HTMLResponse,
+    JSONResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from video_converter.core.converter import (
+    ConversionConfig,
+    VideoConverter,
+    generate_output_path,
+)
 
-from video_converter.core.converter import ConversionConfig, VideoConverter
+try:
+    import orjson
+except ImportError:  # 未安装 orjson 时使用标准库 json 序列化
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
@@ -42,11 +72,685 @@ VIDEO_MIME_TYPES: Dict[str, str] = {
     "m4v": "video/x-m4v",
 }
 
+# 执行转换任务的全局线程池，保留一个核心给事件循环线程
+CONVERT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+_CONVERT_POOL = ThreadPoolExecutor(max_workers=CONVERT_WORKERS, thread_name_prefix="vc-convert")
+# 删除临时目录的专用线程池，避免与转换任务或请求处理争用线程
+_CLEANUP_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="vc-clean")
+
+def _dump_json(content: Any) -> bytes:
+    """序列化 JSON 响应体：优先使用 orjson，输出格式与 JSONResponse 一致（UTF-8、无多余空白）。"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """应用默认的 JSON 响应类，安装了 orjson 时使用 orjson 序列化。"""
+
+    def render(self, content: Any) -> bytes:
+        return _dump_json(content)
+
+
+# 服务器不支持 pathsend 扩展时，下载响应每次读取并发送的块大小
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+class SendfileResponse(FileResponse):
+    """
+    视频文件下载响应。
+
+    服务器声明支持 ASGI ``http.response.pathsend`` 扩展时，Starlette 只把文件路径交给服务器，
+    由服务器直接发送（可使用 sendfile 零拷贝）；否则退回分块读取，并使用更大的块以减少往返次数。
+    """
+
+    chunk_size = DOWNLOAD_CHUNK_BYTES
+
+
+# 允许 /api/convert_by_path 直接读取的服务器本地目录，由环境变量 VC_ALLOWED_ROOTS 指定
+# （多个目录用 os.pathsep 分隔）；未设置时该接口关闭
+ALLOWED_ROOTS: Tuple[Path, ...] = tuple(
+    Path(root).expanduser().resolve()
+    for root in os.environ.get("VC_ALLOWED_ROOTS", "").split(os.pathsep)
+    if root
+)
+
+# 转换结果缓存目录，由环境变量 VC_CACHE_DIR 指定；未设置时不缓存。
+# 以上传内容的 BLAKE2b 摘要和目标格式为键，相同文件重复转换为相同格式时直接返回缓存结果
+CACHE_DIR: Optional[Path] = (
+    Path(os.environ["VC_CACHE_DIR"]).expanduser() if os.environ.get("VC_CACHE_DIR") else None
+)
+
+# 上传请求体的大小上限（字节），可通过环境变量 VC_MAX_UPLOAD_BYTES 调整，0 表示不限制
+MAX_UPLOAD_BYTES = int(os.environ.get("VC_MAX_UPLOAD_BYTES", 16 * 1024 * 1024 * 1024))
+
+
+class UploadLimitMiddleware:
+    """
+    在读取请求体之前根据 Content-Length 拒绝过大的上传。
+
+    FastAPI 会在调用接口函数之前解析完整个表单，接口内的检查无法省下上传本身的开销，
+    因此放在 ASGI 中间件中完成。
+    """
+
+    def __init__(self, app: ASGIApp, max_bytes: int, paths: tuple = ("/api/convert",)) -> None:
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and self.max_bytes > 0 and scope["path"] in self.paths:
+            content_length = Headers(scope=scope).get("content-length")
+            if content_length is not None:
+                try:
+                    too_large = int(content_length) > self.max_bytes
+                except ValueError:
+                    response = FastJSONResponse({"detail": "无效的 Content-Length"}, status_code=400)
+                    await response(scope, receive, send)
+                    return
+                if too_large:
+                    logger.warning("拒绝过大的上传: %s 字节 (上限 %s)", content_length, self.max_bytes)
+                    response = FastJSONResponse(
+                        {"detail": f"上传文件过大，最大允许 {self.max_bytes} 字节"},
+                        status_code=413,
+                    )
+                    await response(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
+
+
+# 流式转换时每次从 ffmpeg 标准输出读取的块大小，以及失败时保留的 stderr 末尾字节数
+STREAM_CHUNK_BYTES = 1024 * 1024
+_STDERR_TAIL_BYTES = 64 * 1024
+
+
+def _hold_convert_slot(acquired: Callable[[], None], release: threading.Event) -> None:
+    """在转换线程池中执行：占用一个线程直到 release 被设置；请求在排队时已放弃则直接返回。"""
+    if release.is_set():
+        return
+    acquired()
+    release.wait()
+
+
+async def _acquire_convert_slot() -> threading.Event:
+    """
+    占用转换线程池中的一个线程，返回的 Event 被设置时释放。
+
+    流式转换在事件循环中运行 ffmpeg，借此与普通转换共用 CONVERT_WORKERS 这一个上限。
+    """
+    loop = asyncio.get_running_loop()
+    acquired = loop.create_future()
+    release = threading.Event()
+
+    def notify() -> None:
+        if not acquired.done():
+            acquired.set_result(None)
+
+    _CONVERT_POOL.submit(_hold_convert_slot, lambda: loop.call_soon_threadsafe(notify), release)
+    try:
+        await acquired
+    except BaseException:
+        release.set()
+        raise
+    return release
+
+
+class _FFmpegStreamingResponse(StreamingResponse):
+    """
+    ffmpeg 流式输出的响应。
+
+    无论发送成功、客户端中途断开，还是响应头都没能发出（此时生成器根本不会启动），
+    发送结束后都会调用 on_close 结束 ffmpeg、释放并发名额并删除临时目录。
+    """
+
+    def __init__(self, content: AsyncIterator[bytes], on_close: Callable[[], None], **kwargs: Any) -> None:
+        super().__init__(content, **kwargs)
+        self._on_close = on_close
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._on_close()
+
+# 无法使用 sendfile 时，保存上传文件所用的读缓冲区大小（每次保存预分配一次并重复使用）
+UPLOAD_CHUNK_BYTES = 32 * 1024 * 1024
+
+
+# 不超过该大小的上传暂存到内存文件系统，避免上传写入和 ffmpeg 读取两次经过磁盘
+RAM_STAGING_MAX_BYTES = 512 * 1024 * 1024
+RAM_STAGING_DIR = Path("/dev/shm")
+
+
+# 暂存到内存时按上传大小的倍数预留空间：输入文件本身加上输出文件（重新编码的输出可能比输入大）
+RAM_STAGING_FACTOR = 3
+
+# 已暂存到内存文件系统的临时目录及其预留的字节数。statvfs 只反映已经写入的数据，
+# 并发上传若不扣除彼此的预留量，会针对同一份剩余空间同时通过检查
+_ram_reserved: Dict[Path, int] = {}
+_ram_reserved_lock = threading.Lock()
+
+
+def _make_temp_dir(upload_size: Optional[int]) -> Path:
+    """
+    创建暂存上传文件的临时目录。
+
+    小文件在内存文件系统扣除其他请求的预留量后仍有足够空间时放在 /dev/shm 中并登记预留，
+    其余情况使用系统默认临时目录。预留在 _remove_temp_dir 删除目录时释放。
+    """
+    if upload_size is not None and upload_size < RAM_STAGING_MAX_BYTES:
+        needed = upload_size * RAM_STAGING_FACTOR
+        with _ram_reserved_lock:
+            try:
+                stat = os.statvfs(RAM_STAGING_DIR)
+            except (AttributeError, OSError):  # 非 Linux 平台或没有 /dev/shm
+                stat = None
+            if stat is not None and stat.f_bavail * stat.f_frsize - sum(_ram_reserved.values()) >= needed:
+                temp_dir = Path(tempfile.mkdtemp(prefix="video_converter_", dir=str(RAM_STAGING_DIR)))
+                _ram_reserved[temp_dir] = needed
+                return temp_dir
+    return Path(tempfile.mkdtemp(prefix="video_converter_"))
+
+
+def _is_ram_staged(temp_dir: Path) -> bool:
+    with _ram_reserved_lock:
+        return temp_dir in _ram_reserved
+
+
+# 内存文件系统剩余空间低于该值时，认为转换失败是因为空间被写满
+RAM_STAGING_EXHAUSTED_BYTES = 1024 * 1024
+
+
+def _ram_staging_exhausted() -> bool:
+    try:
+        stat = os.statvfs(RAM_STAGING_DIR)
+    except (AttributeError, OSError):
+        return False
+    return stat.f_bavail * stat.f_frsize < RAM_STAGING_EXHAUSTED_BYTES
+
+
+def _move_to_disk(temp_dir: Path, input_path: Path) -> Tuple[Path, Path]:
+    """把暂存在内存中的输入文件移到磁盘临时目录，删除原目录（连同失败留下的输出）并释放预留。"""
+    disk_dir = _make_temp_dir(None)
+    try:
+        disk_input = Path(shutil.move(str(input_path), str(disk_dir / input_path.name)))
+    except BaseException:
+        shutil.rmtree(disk_dir, ignore_errors=True)
+        raise
+    _remove_temp_dir(temp_dir)
+    return disk_dir, disk_input
+
+
+def _write_all(fd: int, data: memoryview) -> None:
+    """把缓冲区完整写入文件描述符（os.write 可能只写入一部分）。"""
+    written = 0
+    while written < len(data):
+        written += os.write(fd, data[written:])
+
+
+def _advise_sequential(fd: int) -> None:
+    """提示内核按顺序读取该文件（加大预读），不支持 posix_fadvise 的平台上忽略。"""
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            pass
+
+
+# 表示当前平台或文件系统不支持对普通文件使用 sendfile 的错误码；其他错误（如 ENOSPC、EIO）直接抛出
+_SENDFILE_UNSUPPORTED_ERRNOS = frozenset({
+    errno.EINVAL, errno.ENOSYS, errno.ENOTSOCK, errno.EOPNOTSUPP, errno.ENOTSUP,
+})
+
+
+def _copy_fd(src_fd: int, dst_fd: int) -> None:
+    """复制整个文件：优先使用 os.sendfile 在内核中完成，不支持时退回读写循环。"""
+    size = os.fstat(src_fd).st_size
+    _advise_sequential(src_fd)
+    offset = 0
+    if hasattr(os, "sendfile"):
+        try:
+            while offset < size:
+                sent = os.sendfile(dst_fd, src_fd, offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+            return
+        except OSError as exc:
+            # 部分平台（如 macOS）的 sendfile 只能发送到套接字
+            if exc.errno not in _SENDFILE_UNSUPPORTED_ERRNOS:
+                raise
+            logger.debug("sendfile 不可用，改用普通读写复制文件")
+
+    os.lseek(src_fd, offset, os.SEEK_SET)
+    with open(src_fd, "rb", buffering=0, closefd=False) as source:
+        _copy_stream(source, dst_fd)
+
+
+def _copy_stream(source: BinaryIO, dst_fd: int, hasher: Any = None) -> None:
+    """
+    把文件对象的剩余内容读入预分配的缓冲区后写出，不为每个块分配新的 bytes 对象。
+
+    传入 hasher（hashlib 对象）时同时计算写出内容的摘要。
+    """
+    view = memoryview(bytearray(UPLOAD_CHUNK_BYTES))
+    while size := source.readinto(view):
+        if hasher is not None:
+            hasher.update(view[:size])
+        _write_all(dst_fd, view[:size])
+
+
+def _save_upload(source: BinaryIO, destination: Path, hasher: Any = None) -> None:
+    """
+    将 UploadFile 背后的文件对象保存到 destination，避免逐块经过 Python bytes 复制。
+
+    SpooledTemporaryFile 已落盘时用 os.sendfile 在内核中复制，仍在内存中时一次写出内存缓冲区；
+    其他文件对象读入预分配的缓冲区后写出。传入 hasher 时在写入的同时计算内容摘要，
+    此时落盘的上传改为读入缓冲区复制（sendfile 的数据不经过用户态，无法计算摘要）。
+    """
+    fd = os.open(destination, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        if not isinstance(source, tempfile.SpooledTemporaryFile):
+            _copy_stream(source, fd, hasher)
+        elif source._rolled:
+            source.flush()
+            if hasher is None:
+                _copy_fd(source.fileno(), fd)
+            else:
+                source.seek(0)
+                _advise_sequential(source.fileno())
+                _copy_stream(source, fd, hasher)
+        else:
+            with source._file.getbuffer() as view:
+                if hasher is not None:
+                    hasher.update(view)
+                _write_all(fd, view)
+    finally:
+        os.close(fd)
+
+
+def _copy_new(source: Path, destination: Path) -> None:
+    """
+    把 source 的内容复制为新文件 destination（用 os.sendfile 在内核中复制）。
+
+    destination 已存在时抛出 FileExistsError，不会覆盖已有文件。
+    """
+    src_fd = os.open(source, os.O_RDONLY)
+    try:
+        dst_fd = os.open(destination, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        try:
+            _copy_fd(src_fd, dst_fd)
+        except OSError:
+            os.unlink(destination)  # 不留下复制了一半的文件
+            raise
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+
+
+def _link_or_copy(source: Path, destination: Path) -> None:
+    """
+    用硬链接把 source 放到 destination（只是元数据操作），跨文件系统等无法链接时复制内容。
+
+    destination 已存在时抛出 FileExistsError，不会覆盖已有文件。
+    """
+    try:
+        os.link(source, destination)
+    except FileExistsError:
+        raise
+    except OSError:  # 跨文件系统或文件系统不支持硬链接
+        _copy_new(source, destination)
+
+
+def _move_file(source: Path, destination: Path) -> None:
+    """
+    移动文件：同一文件系统内直接重命名（只修改元数据）；
+    跨文件系统时用 os.sendfile 在内核中复制内容，再删除源文件。
+    """
+    try:
+        os.replace(source, destination)
+        return
+    except OSError as exc:
+        if exc.errno != errno.EXDEV:
+            raise
+
+    src_fd = os.open(source, os.O_RDONLY)
+    try:
+        dst_fd = os.open(destination, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        try:
+            _copy_fd(src_fd, dst_fd)
+        except OSError:
+            os.unlink(destination)  # 不留下复制了一半的文件
+            raise
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    os.unlink(source)
+
+
+def _cached_output(cache_path: Path, name: str, output_dir: Optional[Path]) -> Optional[Path]:
+    """
+    查找缓存的转换结果，未命中时返回 None。
+
+    命中时直接发送缓存文件；指定了输出目录时把缓存文件复制到该目录中名为 name 的新文件。
+    这里不使用硬链接：用户修改输出文件时会连同缓存一起改掉。
+    """
+    if not cache_path.is_file():
+        return None
+    if output_dir:
+        destination = output_dir / name
+        try:
+            _copy_new(cache_path, destination)
+            logger.info("输出文件已放到 %s", destination)
+            return destination
+        except OSError as link_exc:
+            logger.warning("放置输出文件失败，使用默认位置: %s", link_exc)
+    return cache_path
+
+
+def _store_in_cache(output_path: Path, cache_path: Path, link: bool) -> None:
+    """
+    把转换结果放入缓存：先放到临时名称再原子重命名，其他请求不会读到不完整的文件。
+
+    link 为真（输出仍在即将删除的临时目录中）时使用硬链接；
+    输出已放到用户目录时复制内容，避免缓存与用户文件共用同一个 inode。
+    """
+    if cache_path.exists():
+        return
+    partial = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        if link:
+            _link_or_copy(output_path, partial)
+        else:
+            _copy_new(output_path, partial)
+        os.replace(partial, cache_path)
+    except OSError as exc:
+        logger.warning("写入转换缓存失败: %s", exc)
+        try:
+            os.unlink(partial)
+        except OSError:
+            pass
+
+
+async def _cache_output(output_path: Path, cache_path: Path, link: bool) -> None:
+    """在清理线程池中把转换结果放入缓存（在删除临时目录之前执行）。"""
+    await asyncio.get_running_loop().run_in_executor(
+        _CLEANUP_POOL, _store_in_cache, output_path, cache_path, link
+    )
+
+
+def _remove_temp_dir(temp_dir: Path, *files: Optional[Path]) -> None:
+    """
+    删除临时目录。
+
+    目录中只会有已知的输入和输出文件，逐个删除后直接 rmdir，不必遍历目录；
+    目录中还有其他文件（例如 ffmpeg 中途失败留下的输出）时才退回 rmtree。
+    """
+    for path in files:
+        if path is not None and path.parent == temp_dir:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+    try:
+        os.rmdir(temp_dir)
+    except OSError:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    with _ram_reserved_lock:
+        _ram_reserved.pop(temp_dir, None)
+
+
+async def _cleanup(temp_dir: Path, *files: Optional[Path]) -> None:
+    """在清理线程池中删除临时目录，files 为目录中已知的文件。"""
+    await asyncio.get_running_loop().run_in_executor(
+        _CLEANUP_POOL, functools.partial(_remove_temp_dir, temp_dir, *files)
+    )
+
+
+@lru_cache(maxsize=32)
+def _resolve_output_dir(output_folder: str) -> Path:
+    """
+    展开并校验用户指定的输出目录，同一目录重复使用时不再访问文件系统。
+
+    目录无效时抛出 NotADirectoryError；lru_cache 不缓存异常，之后创建的目录仍可被识别。
+    """
+    candidate = Path(output_folder).expanduser()
+    if not candidate.is_dir():
+        raise NotADirectoryError(output_folder)
+    return candidate
+
+
+@lru_cache(maxsize=1)
+def _default_config() -> ConversionConfig:
+    """返回默认转换配置（配置不可变，整个进程共用一份）。"""
+    return ConversionConfig()
+
+
+@lru_cache(maxsize=8)
+def _get_converter(max_workers: int) -> VideoConverter:
+    """
+    返回指定并行数对应的转换器，同一参数的请求复用同一实例，避免每次请求重复检查 ffmpeg。
+
+    VideoConverter 的探测缓存自带锁，其余状态在构造后只读，可在多个线程中同时使用。
+    """
+    return VideoConverter(ConversionConfig(max_workers=max_workers))
+
+
+# 支持的目标格式及其下载 MIME 类型在进程内不会变化，导入时生成一次
+_SUPPORTED = frozenset(_default_config().supported_formats or ())
+_MEDIA_TYPES: Dict[str, str] = {
+    fmt: VIDEO_MIME_TYPES.get(fmt, "application/octet-stream") for fmt in _SUPPORTED
+}
+
+
+def _check_target_format(target_format: str) -> str:
+    """规范化目标格式，不支持时返回 400。"""
+    target_format = target_format.lower().strip()
+    if target_format not in _SUPPORTED:
+        raise HTTPException(status_code=400, detail=f"不支持的目标格式: {target_format}")
+    return target_format
+
+
+async def _requested_output_dir(output_folder: Optional[str]) -> Optional[Path]:
+    """解析用户指定的输出目录，无效时记录警告并返回 None（使用默认位置）。"""
+    if not output_folder:
+        return None
+    try:
+        output_dir = await run_in_threadpool(_resolve_output_dir, output_folder)
+    except OSError:
+        logger.warning("忽略无效的输出目录: %s", output_folder)
+        return None
+    logger.info("用户指定输出目录: %s", output_dir)
+    return output_dir
+
+
+def _resolve_source_path(source_path: str) -> Path:
+    """
+    解析服务器本地的源文件路径（符号链接按实际位置判断）。
+
+    文件不存在时抛出 FileNotFoundError，不在 ALLOWED_ROOTS 之下时抛出 PermissionError。
+    """
+    source = Path(source_path).expanduser().resolve(strict=True)
+    if not any(root == source or root in source.parents for root in ALLOWED_ROOTS):
+        raise PermissionError(source_path)
+    if not source.is_file():
+        raise FileNotFoundError(source_path)
+    return source
+
+
+def _convert_file(
+    input_path: Path, target_format: str, max_workers: int, output_dir: Optional[Path], link_unchanged: bool = False
+) -> Path:
+    """在转换线程池中执行：转换单个文件，按需移动到输出目录，返回输出文件路径。"""
+    converter = _get_converter(max_workers)
+    result = converter.convert_video(str(input_path), target_format=target_format)
+    if not result.success or not result.output_path:
+        msg = result.error_message or "转换失败"
+        raise HTTPException(status_code=500, detail=msg)
+    output = Path(result.output_path)
+    if output == input_path:  # 转换器判断无需转换，不移动源文件本身
+        return _place_unchanged(input_path, output_dir, link_unchanged)
+    if output_dir:
+        destination = output_dir / output.name
+        try:
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            _move_file(output, destination)
+            logger.info("输出文件已移动到 %s", destination)
+            return destination
+        except Exception as move_exc:  # noqa: BLE001
+            logger.warning("移动输出文件失败，使用默认位置: %s", move_exc)
+    return output
+
+
+def _place_unchanged(input_path: Path, output_dir: Optional[Path], link: bool = False) -> Path:
+    """
+    源文件已是目标格式：按需把它放到输出目录，源文件保持不动。
+
+    只有 link 为 True（源文件是本次上传的临时文件）时才使用硬链接；服务器上的原文件
+    必须复制，否则修改输出文件会同时改动原文件。
+    """
+    if output_dir:
+        destination = output_dir / input_path.name
+        try:
+            if link:
+                _link_or_copy(input_path, destination)
+            else:
+                _copy_new(input_path, destination)
+            logger.info("输出文件已放到 %s", destination)
+            return destination
+        except OSError as link_exc:
+            logger.warning("放置输出文件失败，使用默认位置: %s", link_exc)
+    return input_path
+
+
+def _content_disposition(filename: str) -> str:
+    """生成附件下载的 Content-Disposition 头，非 ASCII 文件名按 RFC 5987 编码（与 FileResponse 一致）。"""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+async def _read_tail(stream: asyncio.StreamReader) -> str:
+    """读完整个流，只保留末尾部分（用于记录 ffmpeg 的错误信息）。"""
+    tail = bytearray()
+    while chunk := await stream.read(STREAM_CHUNK_BYTES):
+        tail += chunk
+        del tail[:-_STDERR_TAIL_BYTES]
+    return tail.decode(errors="replace")
+
+
+async def _stream_conversion(
+    input_path: Path, target_format: str, max_workers: int, temp_dir: Path
+) -> Optional[StreamingResponse]:
+    """
+    启动把结果写到标准输出的 ffmpeg，边转换边把输出发送给客户端。
+
+    目标格式不支持流式输出时返回 None。等到 ffmpeg 产生第一块数据后才返回响应，
+    因此立即失败的转换仍能返回 500；客户端中途断开时结束 ffmpeg，发送结束后删除临时目录。
+    探测编码前就占用转换线程池的名额，与普通转换共用并发上限，名额一直占用到响应发送结束。
+    """
+    release_slot = await _acquire_convert_slot()
+    try:
+        converter = await run_in_threadpool(_get_converter, max_workers)
+        cmd = await converter.build_stream_command(str(input_path), target_format)
+    except BaseException:
+        release_slot.set()
+        raise
+    if cmd is None:
+        release_slot.set()
+        logger.info("%s 格式不支持流式输出，改为转换完成后再发送", target_format)
+        return None
+
+    process: Optional[asyncio.subprocess.Process] = None
+    closed = False
+
+    def close() -> None:
+        # 不在这里等待进程退出：客户端断开时调用方正被取消
+        nonlocal closed
+        if closed:
+            return
+        closed = True
+        if process is not None and process.returncode is None:
+            logger.info("流式响应提前结束，结束 ffmpeg 进程: %s", input_path.name)
+            process.kill()
+        release_slot.set()
+        _CLEANUP_POOL.submit(_remove_temp_dir, temp_dir, input_path)
+
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        stderr_tail = asyncio.ensure_future(_read_tail(process.stderr))
+        first_chunk = await process.stdout.read(STREAM_CHUNK_BYTES)
+        if not first_chunk:
+            returncode = await process.wait()
+            if returncode != 0:
+                logger.error("ffmpeg 流式转换失败: %s", await stderr_tail)
+                raise HTTPException(status_code=500, detail="转换失败")
+    except BaseException:
+        close()
+        raise
+
+    async def body() -> AsyncIterator[bytes]:
+        chunk = first_chunk
+        while chunk:
+            yield chunk
+            chunk = await process.stdout.read(STREAM_CHUNK_BYTES)
+        if await process.wait() != 0:
+            logger.error("ffmpeg 流式转换中途失败: %s", await stderr_tail)
+        else:
+            logger.info("流式转换完成: %s -> %s", input_path.name, target_format)
+
+    return _FFmpegStreamingResponse(
+        body(),
+        close,
+        media_type=_MEDIA_TYPES[target_format],
+        headers={"Content-Disposition": _content_disposition(f"{input_path.stem}.{target_format}")},
+    )
+
+
+async def _run_conversion(
+    input_path: Path,
+    target_format: str,
+    max_workers: int,
+    output_dir: Optional[Path],
+    link_unchanged: bool = False,
+) -> Path:
+    """
+    转换文件；源文件已是目标格式时不占用转换线程池，也不调用 ffmpeg。
+
+    link_unchanged 表示 input_path 是上传的临时文件，无需转换时可以硬链接到输出目录。
+    """
+    if input_path.suffix[1:].lower() == target_format:
+        logger.info("源文件已是 %s 格式，直接返回（pass-through）: %s", target_format, input_path.name)
+        return await run_in_threadpool(_place_unchanged, input_path, output_dir, link_unchanged)
+    return await asyncio.get_running_loop().run_in_executor(
+        _CONVERT_POOL,
+        functools.partial(_convert_file, input_path, target_format, max_workers, output_dir, link_unchanged),
+    )
+
 
 def create_app() -> FastAPI:
     """创建 FastAPI 应用。"""
-    app = FastAPI(title="Video Converter API", version="1.0.0")
+    app = FastAPI(
+        title="Video Converter API",
+        version="1.0.0",
+        default_response_class=FastJSONResponse,
+    )
 
+    # 先添加的中间件位于内层，413 响应也会带上 CORS 头
+    app.add_middleware(UploadLimitMiddleware, max_bytes=MAX_UPLOAD_BYTES)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
@@ -55,6 +759,24 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    # 支持的格式在进程内不会变化，预先生成格式列表的响应体
+    config = _default_config()
+    formats = list(config.supported_formats or [])
+    formats_body = _dump_json({"default": formats[0] if formats else "mp4", "formats": formats})
+
+    if CACHE_DIR is not None:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        logger.info("转换结果缓存目录: %s", CACHE_DIR)
+
+    # 前端页面只在启动时读取一次，同时准备 gzip 压缩版本和 ETag
+    gui_bytes = GUI_FILE.read_bytes() if GUI_FILE.exists() else None
+    if gui_bytes is not None:
+        gui_gzip = gzip.compress(gui_bytes, compresslevel=9)
+        gui_headers = {
+            "ETag": f'"{hashlib.blake2b(gui_bytes, digest_size=8).hexdigest()}"',
+            "Vary": "Accept-Encoding",
+        }
+
     if RESOURCES_DIR.exists():
         app.mount(
             "/static",
@@ -62,22 +784,25 @@ def create_app() -> FastAPI:
             name="static",
         )
 
-    @app.get("/", response_class=FileResponse)
-    async def index() -> Response:
+    @app.get("/", response_class=HTMLResponse)
+    async def index(request: Request) -> Response:
         """返回前端页面。"""
-        if not GUI_FILE.exists():
+        if gui_bytes is None:
             raise HTTPException(status_code=404, detail="前端页面缺失")
-        return FileResponse(GUI_FILE)
+        if_none_match = request.headers.get("if-none-match", "")
+        if gui_headers["ETag"] in if_none_match or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=gui_headers)
+        if "gzip" in request.headers.get("accept-encoding", ""):
+            return HTMLResponse(gui_gzip, headers={**gui_headers, "Content-Encoding": "gzip"})
+        return HTMLResponse(gui_bytes, headers=gui_headers)
 
     @app.get("/api/formats")
-    async def list_formats() -> JSONResponse:
+    async def list_formats() -> Response:
         """返回支持的视频格式列表。"""
-        config = ConversionConfig()
-        return JSONResponse(
-            {
-                "default": config.supported_formats[0] if config.supported_formats else "mp4",
-                "formats": config.supported_formats or [],
-            }
+        return Response(
+            content=formats_body,
+            media_type="application/json",
+            headers={"Cache-Control": "public, max-age=300"},
         )
 
     @app.post("/api/convert")
@@ -88,93 +813,159 @@ def create_app() -> FastAPI:
         max_workers: int = Form(4),
         use_parallel: bool = Form(True),
         output_folder: Optional[str] = Form(None),
-    ) -> FileResponse:
-        """上传视频并转换成指定格式，返回转换后的文件。"""
-        target_format = target_format.lower().strip()
-        config = ConversionConfig(max_workers=max_workers)
+        stream: bool = Form(False),
+    ) -> Response:
+        """
+        上传视频并转换成指定格式，返回转换后的文件。
 
-        if target_format not in (config.supported_formats or []):
-            raise HTTPException(status_code=400, detail=f"不支持的目标格式: {target_format}")
+        stream 为真且目标格式支持流式封装（mp4/mov/mkv/webm）时，ffmpeg 的输出边生成边发送，
+        不等待转换完成，此时不会保存输出文件。
+        """
+        target_format = _check_target_format(target_format)
+        # 并行数由服务端限制，避免客户端请求过多的并发 ffmpeg 进程
+        max_workers = min(max(1, max_workers), CONVERT_WORKERS)
 
         if not file.filename:
             raise HTTPException(status_code=400, detail="文件名缺失")
 
-        temp_dir = Path(tempfile.mkdtemp(prefix="video_converter_"))
+        temp_dir = _make_temp_dir(file.size)
         input_path = temp_dir / file.filename
 
         logger.info("接收到文件: %s -> %s", file.filename, input_path)
 
-        # 将上传内容写入临时文件
+        # 将上传内容写入临时文件；启用缓存时同时计算内容摘要
+        hasher = hashlib.blake2b(digest_size=32) if CACHE_DIR is not None else None
         try:
-            with open(input_path, "wb") as buffer:
-                while chunk := await file.read(8 * 1024 * 1024):
-                    buffer.write(chunk)
+            try:
+                await run_in_threadpool(_save_upload, file.file, input_path, hasher)
+            except OSError as exc:
+                # 内存文件系统被其他进程占满时改用磁盘临时目录重新保存
+                if exc.errno != errno.ENOSPC or not _is_ram_staged(temp_dir):
+                    raise
+                logger.warning("内存文件系统空间不足，改用磁盘临时目录: %s", file.filename)
+                await _cleanup(temp_dir, input_path)
+                temp_dir = _make_temp_dir(None)
+                input_path = temp_dir / file.filename
+                hasher = hashlib.blake2b(digest_size=32) if CACHE_DIR is not None else None
+                await run_in_threadpool(file.file.seek, 0)
+                await run_in_threadpool(_save_upload, file.file, input_path, hasher)
         except Exception as exc:  # noqa: BLE001
-            shutil.rmtree(temp_dir, ignore_errors=True)
+            await _cleanup(temp_dir, input_path)
             logger.error("写入临时文件失败: %s", exc)
             raise HTTPException(status_code=500, detail="写入临时文件失败") from exc
         finally:
             await file.close()
 
-        # 定义转换函数，在线程池中执行
-        requested_output_dir: Optional[Path] = None
-        if output_folder:
-            candidate = Path(output_folder).expanduser()
-            if candidate.exists() and candidate.is_dir():
-                requested_output_dir = candidate
-                logger.info("用户指定输出目录: %s", requested_output_dir)
-            else:
-                logger.warning("忽略无效的输出目录: %s", output_folder)
+        requested_output_dir = await _requested_output_dir(output_folder)
 
         if not use_parallel:
             logger.info("收到禁用并行参数，单文件转换将顺序执行")
 
-        def _do_convert() -> Path:
-            converter = VideoConverter(ConversionConfig(max_workers=max_workers))
-            result = converter.convert_video(str(input_path), target_format=target_format)
-            if not result.success or not result.output_path:
-                msg = result.error_message or "转换失败"
-                raise HTTPException(status_code=500, detail=msg)
-            output = Path(result.output_path)
-            if requested_output_dir:
-                destination = requested_output_dir / output.name
-                try:
-                    destination.parent.mkdir(parents=True, exist_ok=True)
-                    shutil.move(str(output), destination)
-                    logger.info("输出文件已移动到 %s", destination)
-                    return destination
-                except Exception as move_exc:  # noqa: BLE001
-                    logger.warning("移动输出文件失败，使用默认位置: %s", move_exc)
-            return output
+        needs_conversion = input_path.suffix[1:].lower() != target_format
+        cache_path: Optional[Path] = None
+        if hasher is not None and needs_conversion:
+            cache_path = CACHE_DIR / f"{hasher.hexdigest()}_{target_format}"
 
         try:
-            output_path = await run_in_threadpool(_do_convert)
+            output_path: Optional[Path] = None
+            download_name: Optional[str] = None
+            if cache_path is not None:
+                # 与转换器的输出命名一致，放到输出目录时不会与已有文件重名
+                download_name = Path(generate_output_path(str(input_path), target_format)).name
+                output_path = await run_in_threadpool(
+                    _cached_output, cache_path, download_name, requested_output_dir
+                )
+                if output_path is not None:
+                    logger.info("命中转换缓存: %s -> %s", input_path.name, cache_path.name)
+                    cache_path = None
+            if output_path is None and stream and needs_conversion:
+                response = await _stream_conversion(input_path, target_format, max_workers, temp_dir)
+                if response is not None:
+                    if requested_output_dir:
+                        logger.warning("流式转换不保存输出文件，忽略输出目录: %s", requested_output_dir)
+                    return response
+            if output_path is None:
+                try:
+                    output_path = await _run_conversion(
+                        input_path, target_format, max_workers, requested_output_dir, link_unchanged=True
+                    )
+                except HTTPException:
+                    # 输出写满了内存文件系统时改到磁盘上重新转换
+                    if not (_is_ram_staged(temp_dir) and _ram_staging_exhausted()):
+                        raise
+                    logger.warning("内存文件系统空间不足，改用磁盘临时目录重新转换: %s", input_path.name)
+                    temp_dir, input_path = await run_in_threadpool(_move_to_disk, temp_dir, input_path)
+                    output_path = await _run_conversion(
+                        input_path, target_format, max_workers, requested_output_dir, link_unchanged=True
+                    )
         except HTTPException:
-            shutil.rmtree(temp_dir, ignore_errors=True)
+            await _cleanup(temp_dir, input_path)
             raise
         except Exception as exc:  # noqa: BLE001
-            shutil.rmtree(temp_dir, ignore_errors=True)
+            await _cleanup(temp_dir, input_path)
             logger.exception("转换失败: %s", exc)
             raise HTTPException(status_code=500, detail="服务器转换失败") from exc
 
-        media_type = VIDEO_MIME_TYPES.get(target_format, "application/octet-stream")
-        download_name = output_path.name
+        media_type = _MEDIA_TYPES[target_format]
+        if output_path.parent != CACHE_DIR:
+            download_name = output_path.name
 
-        # 转换完成后再删除临时目录
-        background.add_task(shutil.rmtree, temp_dir, ignore_errors=True)
+        # 发送完成后先写入缓存，再删除临时目录
+        if cache_path is not None:
+            background.add_task(_cache_output, output_path, cache_path, output_path.parent == temp_dir)
+        background.add_task(_cleanup, temp_dir, output_path, input_path)
 
         logger.info("转换完成: %s -> %s", input_path.name, download_name)
 
-        return FileResponse(
+        return SendfileResponse(
             path=output_path,
             media_type=media_type,
             filename=download_name,
             background=background,
         )
 
+    @app.post("/api/convert_by_path")
+    async def convert_by_path(
+        source_path: str = Form(...),
+        target_format: str = Form("mp4"),
+        max_workers: int = Form(4),
+        output_folder: Optional[str] = Form(None),
+    ) -> Dict[str, str]:
+        """
+        直接转换服务器本地的视频文件，省去上传和写入临时文件。
+
+        只允许 VC_ALLOWED_ROOTS 指定目录下的文件；输出默认写在源文件旁边，返回输出文件路径。
+        """
+        if not ALLOWED_ROOTS:
+            raise HTTPException(status_code=404, detail="未启用按路径转换（未设置 VC_ALLOWED_ROOTS）")
+        target_format = _check_target_format(target_format)
+        max_workers = min(max(1, max_workers), CONVERT_WORKERS)
+
+        try:
+            source = await run_in_threadpool(_resolve_source_path, source_path)
+        except PermissionError as exc:
+            logger.warning("拒绝访问允许目录之外的文件: %s", source_path)
+            raise HTTPException(status_code=403, detail="源文件不在允许的目录中") from exc
+        except OSError as exc:
+            raise HTTPException(status_code=404, detail=f"文件不存在: {source_path}") from exc
+
+        logger.info("按路径转换: %s", source)
+        requested_output_dir = await _requested_output_dir(output_folder)
+
+        try:
+            output_path = await _run_conversion(source, target_format, max_workers, requested_output_dir)
+        except HTTPException:
+            raise
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("转换失败: %s", exc)
+            raise HTTPException(status_code=500, detail="服务器转换失败") from exc
+
+        logger.info("转换完成: %s -> %s", source, output_path)
+        return {"input_path": str(source), "output_path": str(output_path)}
+
     return app
 
 
 app = create_app()
 
-__all__ = ["app", "create_app"]
+__all__ = ["app", "create_app", "FastJSONResponse", "SendfileResponse"]